@@ -4,6 +4,37 @@ import numpy as np
 
 import config
 
+def compute_band_maxima(radiance_data: np.ndarray,
+                        cloud_mask: np.ndarray = None) -> np.ndarray:
+    """
+    Calculates the maximum radiance of each spectral band in the datacube.
+
+    The datacube is viewed as a flat (bands, rows * columns) array, so each
+    band is reduced in a single contiguous scan.
+
+    Parameters
+    ----------
+    radiance_data : np.ndarray
+        A hyperspectral datacube (3D numpy array w/ dimensions bands, rows,
+        columns).
+    cloud_mask : np.ndarray, optional
+        A 2D binary mask (rows x cols) where cloud pixels are marked as 1. If
+        provided, the maxima are those of the masked datacube, with cloud pixels
+        treated as 0.
+
+    Returns
+    -------
+    np.ndarray
+        A 1D array with the maximum radiance of each band.
+    """
+    flat_data = radiance_data.reshape(radiance_data.shape[0], -1)
+
+    if cloud_mask is None:
+        return flat_data.max(axis=1)
+
+    clear_pixels = ~cloud_mask.astype(bool).ravel()
+    return flat_data.max(axis=1, where=clear_pixels, initial=0)
+
 def select_spectral_band(radiance_data: np.ndarray) -> int:
     """
     Display an interactive viewer for selecting a spectral band for thresholding.
@@ -12,12 +43,14 @@ def select_spectral_band(radiance_data: np.ndarray) -> int:
     It includes a slider widget that allows the user to browse through the
     spectral bands by updating the displayed image. The user can finalize
     their selection by pressing the Enter key or closing the plot window.
+    While the slider is being dragged a downsampled band is displayed, and the
+    full resolution band is shown once the slider is released.
 
     Parameters
     ----------
     radiance_data : np.ndarray
-        A hyperspectral datacube (3D numpy array w/ dimensions rows, columns,
-        bands).
+        A hyperspectral datacube (3D numpy array w/ dimensions bands, rows,
+        columns).
 
     Returns
     -------
@@ -25,12 +58,15 @@ def select_spectral_band(radiance_data: np.ndarray) -> int:
         The index of the spectral band selected by the user (0-indexed).
     """
     band_index = [0] # Use a list so it can be updated inside nested functions
-    data_slice = radiance_data[:, :, band_index[0]]
-    max_val = np.max(data_slice)
+    band_max = compute_band_maxima(radiance_data) # Precompute so slider updates are cheap
+    thumbnails = radiance_data[:, ::2, ::2] # Downsampled view shown while scrubbing
+    data_slice = radiance_data[band_index[0]]
+    max_val = band_max[band_index[0]]
 
     fig, ax = plt.subplots()
     plt.subplots_adjust(left=0.2, right=0.8, bottom=0.25)
     im = ax.imshow(data_slice, cmap='gray', vmin=0, vmax=max_val, origin='upper')
+    im.set_extent(im.get_extent()) # Fix the extent so thumbnails fill the same axes
     ax.set_title(f'Band: {band_index[0] + 1}')
     fig.text(
         0.5, -0.1,  # X, Y in axes coordinates (0 to 1)
@@ -46,20 +82,25 @@ def select_spectral_band(radiance_data: np.ndarray) -> int:
     # Function to update image and index when slider is moved
     def update(val):
         band_index[0] = int(band_slider.val) - 1
-        new_data_slice = radiance_data[:, :, band_index[0]]
-        new_max_val = np.max(new_data_slice)
+        new_max_val = band_max[band_index[0]]
 
-        im.set_data(new_data_slice)
+        im.set_data(thumbnails[band_index[0]])
         im.set_clim(vmin=0, vmax=new_max_val)
         ax.set_title(f'Band: {band_index[0] + 1}')
         fig.canvas.draw_idle()
 
+    # Function to show the full resolution band once the slider is released
+    def on_release(event):
+        im.set_data(radiance_data[band_index[0]])
+        fig.canvas.draw_idle()
+
     # Function to use the Enter key to close the plot
     def on_key(event):
         if event.key == 'enter':
             plt.close(fig)
 
     band_slider.on_changed(update)
+    fig.canvas.mpl_connect('button_release_event', on_release)
     fig.canvas.mpl_connect('key_press_event', on_key)
     plt.show()
 
@@ -73,8 +114,8 @@ def select_threshold(radiance_data: np.ndarray, band: int) -> float:
     Parameters
     ----------
     radiance_data : np.ndarray
-        A hyperspectral datacube (3D numpy array w/ dimensions rows, columns,
-        bands).
+        A hyperspectral datacube (3D numpy array w/ dimensions bands, rows,
+        columns).
     band : int
         The index of the spectral band to display.
 
@@ -83,7 +124,8 @@ def select_threshold(radiance_data: np.ndarray, band: int) -> float:
     float
         The radiance value selected by the user to be used as a threshold.
     """
-    data_slice = radiance_data[:, :, band]
+    data_slice = np.ascontiguousarray(radiance_data[band]) # Reused for display, max and clicks
+    num_rows, num_cols = data_slice.shape
     max_value = np.max(data_slice)
     threshold = [0] # Use a list so it can be updated inside nested functions
 
@@ -108,7 +150,9 @@ def select_threshold(radiance_data: np.ndarray, band: int) -> float:
     # Function to register threshold at a mouse click
     def on_mouse_click(event):
         if event.inaxes == ax:
-            x, y = int(event.xdata), int(event.ydata)
+            # Pixel centres are at integer coordinates, so round to the nearest pixel
+            x = min(round(event.xdata), num_cols - 1)
+            y = min(round(event.ydata), num_rows - 1)
             threshold[0] = data_slice[y, x]
             plt.close(fig)
 
@@ -123,7 +167,8 @@ def select_threshold(radiance_data: np.ndarray, band: int) -> float:
 
     return threshold[0]
 
-def create_cloud_mask(radiance_data: np.ndarray, band: int, threshold: float) -> np.ndarray:
+def create_cloud_mask(radiance_data: np.ndarray, band: int, threshold: float, *,
+                      out: np.ndarray = None) -> np.ndarray:
     """
     Creates a binary cloud mask based on a selected spectral band and threshold.
 
@@ -134,12 +179,15 @@ def create_cloud_mask(radiance_data: np.ndarray, band: int, threshold: float) ->
     Parameters
     ----------
     radiance_data : np.ndarray
-        A hyperspectral datacube (3D numpy array w/ dimensions rows, columns,
-        bands).
+        A hyperspectral datacube (3D numpy array w/ dimensions bands, rows,
+        columns).
     band : int
         The index of the spectral band to use for thresholding.
     threshold: float
         The radiance threshold for cloud detection.
+    out : np.ndarray, optional
+        A uint8 array (rows x cols) to write the mask into, so a buffer can be
+        reused across calls. If not provided, a new array is allocated.
     
         
     Returns
@@ -147,12 +195,20 @@ def create_cloud_mask(radiance_data: np.ndarray, band: int, threshold: float) ->
     np.ndarray
         A 2D binary cloud mask with dimensions: rows x cols.
     """
-    num_rows, num_cols, _ = radiance_data.shape
-    mask = np.zeros((num_rows, num_cols), dtype=np.uint8)
+    band_slice = radiance_data[band]
 
-    for row in range(num_rows):
-        for col in range(num_cols):
-            mask[row, col] = 1 if radiance_data[row, col, band] > threshold else 0
+    if out is None:
+        mask = np.empty(band_slice.shape, dtype=np.uint8)
+    elif out.dtype != np.uint8 or out.shape != band_slice.shape:
+        raise ValueError(
+            f'out must be a uint8 array with shape {band_slice.shape}, got a '
+            f'{out.dtype} array with shape {out.shape}'
+        )
+    else:
+        mask = out
+
+    # Compare straight into the uint8 buffer, avoids an intermediate bool array
+    np.greater(band_slice, threshold, out=mask.view(bool))
 
     return mask
 
@@ -172,14 +228,15 @@ def measure_cloud_cover(cloud_mask: np.ndarray) -> float:
     float
         The fraction o fpixels in the image that are classified as clouds.
     """
-    num_cloud_pixels = np.sum(cloud_mask)
+    num_cloud_pixels = np.count_nonzero(cloud_mask)
     num_total_pixels = cloud_mask.size
     cloud_cover_ratio = num_cloud_pixels / num_total_pixels
 
     return cloud_cover_ratio
 
 
-def apply_cloud_mask(radiance_data: np.ndarray, cloud_mask: np.ndarray) -> np.ndarray:
+def apply_cloud_mask(radiance_data: np.ndarray, cloud_mask: np.ndarray, *,
+                     in_place: bool = False) -> np.ndarray:
     """
     Applies a binary cloud mask to a hyperspectral datacube.
 
@@ -188,22 +245,63 @@ def apply_cloud_mask(radiance_data: np.ndarray, cloud_mask: np.ndarray) -> np.nd
     Parameters
     ----------
     radiance_data : np.ndarray
-        A hyperspectral datacube (3D numpy array w/ dimensions rows, columns,
-        bands).
+        A hyperspectral datacube (3D numpy array w/ dimensions bands, rows,
+        columns).
     cloud_mask : np.ndarray
         A 2D binary mask (rows x cols) where cloud pixels are marked as 1.
+    in_place : bool, optional
+        If True, cloud pixels are zeroed directly in `radiance_data` instead of
+        allocating a new datacube. Defaults to False.
 
     Returns
     -------
     np.ndarray
         A masked datacube of the same shape, with cloud pixels zeroed out.
     """
-    num_rows, num_cols, _ = radiance_data.shape
-    masked_data = radiance_data.copy()
+    cloud_pixels = cloud_mask.astype(bool)
+
+    if in_place:
+        radiance_data[:, cloud_pixels] = 0
+        return radiance_data
+
+    # Zero cloud pixels by selection rather than multiplying by the mask, so
+    # inf, NaN and negative values still become exactly 0
+    masked_data = np.zeros_like(radiance_data)
+    np.copyto(masked_data, radiance_data, where=~cloud_pixels[np.newaxis, :, :])
 
-    for row in range(num_rows):
-        for col in range(num_cols):
-            if cloud_mask[row, col] == 1:
-                masked_data[row, col, :] = 0
+    return masked_data
+
+def pack_cloud_mask(cloud_mask: np.ndarray) -> np.ndarray:
+    """
+    Packs a binary cloud mask into 1 bit per pixel for compact storage.
 
-    return masked_data
\ No newline at end of file
+    Parameters
+    ----------
+    cloud_mask : np.ndarray
+        A 2D binary mask (rows x cols) where cloud pixels are marked as 1.
+
+    Returns
+    -------
+    np.ndarray
+        A 2D uint8 array (rows x ceil(cols / 8)) with each row's pixels packed
+        into bits.
+    """
+    return np.packbits(cloud_mask, axis=-1)
+
+def unpack_cloud_mask(packed_mask: np.ndarray, mask_shape: tuple) -> np.ndarray:
+    """
+    Unpacks a cloud mask created with `pack_cloud_mask`.
+
+    Parameters
+    ----------
+    packed_mask : np.ndarray
+        A bit-packed cloud mask, as returned by `pack_cloud_mask`.
+    mask_shape : tuple
+        The shape (rows, cols) of the original cloud mask.
+
+    Returns
+    -------
+    np.ndarray
+        A 2D binary mask (rows x cols) where cloud pixels are marked as 1.
+    """
+    return np.unpackbits(packed_mask, axis=-1, count=mask_shape[-1])
@@ -24,15 +24,24 @@ def load_datacube(datacube_filepath, wavelength_filepath = None):
     -------
     tuple
         - data (ndarray): The hyperspectra datacube (3D numpy array w/ dimensions
-          rows, columns, bands)
-        - data_dimensions (tuple): Dimensions of the data cube (rows, columns,
-          bands)
+          bands, rows, columns). Float data is stored as float32.
+        - data_dimensions (tuple): Dimensions of the data cube (bands, rows,
+          columns)
         - wavelength (ndarray): Array of wavelengths corresponding to the centre
           of each spectral band.
         - wavelength_increment (float): The difference between consecutive
           wavelengths (in nm).
     """
-    data = np.load(datacube_filepath)
+    # Memory-map the file so only the band-first copy below is held in RAM,
+    # rather than a fully loaded cube plus its transposed copy
+    data = np.load(datacube_filepath, mmap_mode='r')
+
+    # Radiance doesn't need double precision, so float64 cubes are downcast to
+    # halve memory traffic. Integer cubes are kept in their native type
+    dtype = np.float32 if data.dtype == np.float64 else data.dtype
+
+    # Store the cube band-first so each band is a contiguous block in memory
+    data = np.ascontiguousarray(np.moveaxis(data, -1, 0), dtype=dtype)
     data_dimensions = data.shape
 
     # If no wavelength file is provided, generate wavelengths linearly
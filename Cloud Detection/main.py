@@ -1,3 +1,5 @@
+import json
+
 import numpy as np
 
 from cloud_detection import *
@@ -24,14 +26,11 @@ if __name__ == '__main__':
     cloud_mask = create_cloud_mask(radiance_data, selected_band, selected_threshold)
     cloud_cover_ratio = measure_cloud_cover(cloud_mask)
     if SAVE_DATA:
-        np.savez_compressed(f'{OUTPUT_FOLDER}cloud_mask', mask = cloud_mask,
-                            band_index = np.array(selected_band),
-                            threshold = np.array(selected_threshold)
-        )
-    print(f'Step 3 done, total cloud cover: {(cloud_cover_ratio * 100):.2f}%')
-
-    # Optional Step - Apply cloud mask to original datacube
-    masked_radiance_data = apply_cloud_mask(radiance_data, cloud_mask)
-    if SAVE_DATA:
-        np.savez_compressed(f'{OUTPUT_FOLDER}masked_datacube', masked_datacube = masked_radiance_data)
-    print('Cloud mask applied')
\ No newline at end of file
+        # The masked datacube isn't saved, it can be recreated from the mask
+        # and the original datacube with apply_cloud_mask
+        np.save(f'{OUTPUT_FOLDER}cloud_mask.npy', pack_cloud_mask(cloud_mask))
+        with open(f'{OUTPUT_FOLDER}cloud_mask.json', 'w') as metadata_file:
+            json.dump({'band_index': int(selected_band),
+                       'threshold': float(selected_threshold),
+                       'mask_shape': list(cloud_mask.shape)}, metadata_file)
+    print(f'Step 3 done, total cloud cover: {(cloud_cover_ratio * 100):.2f}%')
\ No newline at end of file
@@ -1,3 +1,5 @@
+import json
+
 from matplotlib import pyplot as plt
 from matplotlib.widgets import Button, Slider, TextBox
 import numpy as np
@@ -6,6 +8,25 @@ from config import *
 from load_datacube import load_datacube
 import cloud_detection
 
+def load_cloud_mask():
+    """
+    Loads the cloud mask saved by main.py, along with its metadata.
+
+    Returns
+    -------
+    tuple
+        - cloud_mask (np.ndarray): A 2D binary mask (rows x cols) where cloud
+          pixels are marked as 1.
+        - band_index (int): The index of the band the mask was created from.
+        - threshold (float): The threshold the mask was created with.
+    """
+    with open(f'{OUTPUT_FOLDER}cloud_mask.json') as metadata_file:
+        metadata = json.load(metadata_file)
+    packed_mask = np.load(f'{OUTPUT_FOLDER}cloud_mask.npy', mmap_mode='r')
+    cloud_mask = cloud_detection.unpack_cloud_mask(packed_mask, metadata['mask_shape'])
+
+    return cloud_mask, metadata['band_index'], metadata['threshold']
+
 def visualize_band(band: int):
     """
     Display a single spectral band from the datacube. The band is displayed as
@@ -18,7 +39,7 @@ def visualize_band(band: int):
     """
     radiance_data, _, _, _ = load_datacube(DATA_FOLDER + DATACUBE)
 
-    data_slice = radiance_data[:, :, band]
+    data_slice = radiance_data[band]
     max_value = np.max(data_slice)
 
     plt.imshow(data_slice, cmap='gray', vmin=0, vmax=max_value)
@@ -26,7 +47,7 @@ def visualize_band(band: int):
 
 def visualize_cloud_mask():
     """Displays the binary cloud mask as a grayscale image."""
-    cloud_mask = np.load(f'{OUTPUT_FOLDER}cloud_mask.npz')['mask']
+    cloud_mask, _, _ = load_cloud_mask()
 
     plt.imshow(cloud_mask, cmap='gray')
     plt.show()
@@ -41,9 +62,11 @@ def visualize_masked_band(band: int):
     band : int
         The index of the band to visualize (0-indexed).
     """
-    masked_radiance_data = np.load(f'{OUTPUT_FOLDER}masked_datacube.npz')['masked_datacube']
+    radiance_data, _, _, _ = load_datacube(DATA_FOLDER + DATACUBE)
+    cloud_mask, _, _ = load_cloud_mask()
 
-    data_slice = masked_radiance_data[:, :, band]
+    # Only the displayed band is masked, rather than the whole datacube
+    data_slice = np.where(cloud_mask, 0, radiance_data[band])
     max_value = np.max(data_slice)
 
     plt.imshow(data_slice, cmap='gray', vmin=0, vmax=max_value)
@@ -59,18 +82,18 @@ def visualize_datacube_comparison():
     """
     # Load data to display
     radiance_data, _, _, _ = load_datacube(DATA_FOLDER + DATACUBE)
-    masked_radiance_data = np.load(f'{OUTPUT_FOLDER}masked_datacube.npz')['masked_datacube']
-    cloud_mask_data = np.load(f'{OUTPUT_FOLDER}cloud_mask.npz')
-    cloud_mask = cloud_mask_data['mask']
-    band_index = cloud_mask_data['band_index']
-    threshold = cloud_mask_data['threshold']
+    cloud_mask, band_index, threshold = load_cloud_mask()
+
+    # Precompute per-band maxima so slider updates are cheap
+    band_max = cloud_detection.compute_band_maxima(radiance_data)
+    masked_band_max = cloud_detection.compute_band_maxima(radiance_data, cloud_mask)
 
     fig, ax = plt.subplots(ncols=3)
     displayed_band = [0]
 
     # Display band
-    data_slice = radiance_data[:, :, displayed_band[0]]
-    max_value = np.max(data_slice)
+    data_slice = radiance_data[displayed_band[0]]
+    max_value = band_max[displayed_band[0]]
     original_im = ax[0].imshow(data_slice, cmap='gray', vmin=0, vmax=max_value)
     ax[0].set_title(f'Original Data, Band: {displayed_band[0] + 1}')
 
@@ -85,9 +108,9 @@ def visualize_datacube_comparison():
         fontsize=10, color='gray'
     )
 
-    # Display masked band
-    masked_data_slice = masked_radiance_data[:, :, displayed_band[0]]
-    masked_max_value = np.max(masked_data_slice)
+    # Display masked band, only the displayed band is masked
+    masked_data_slice = np.where(cloud_mask, 0, radiance_data[displayed_band[0]])
+    masked_max_value = masked_band_max[displayed_band[0]]
     masked_im = ax[2].imshow(masked_data_slice, cmap='gray', vmin=0, vmax=masked_max_value)
     ax[2].set_title(f'Masked Data, Band: {displayed_band[0] + 1}')
 
@@ -99,15 +122,15 @@ def visualize_datacube_comparison():
         displayed_band[0] = int(band_slider.val) - 1
 
         # Update original band
-        new_data_slice = radiance_data[:, :, displayed_band[0]]
-        new_max_val = np.max(new_data_slice)
+        new_data_slice = radiance_data[displayed_band[0]]
+        new_max_val = band_max[displayed_band[0]]
         original_im.set_data(new_data_slice)
         original_im.set_clim(vmin=0, vmax=new_max_val)
         ax[0].set_title(f'Original Data, Band: {displayed_band[0] + 1}')
 
         # Update masked band
-        new_masked_data_slice = masked_radiance_data[:, :, displayed_band[0]]
-        new_masked_max_val = np.max(new_masked_data_slice)
+        new_masked_data_slice = np.where(cloud_mask, 0, radiance_data[displayed_band[0]])
+        new_masked_max_val = masked_band_max[displayed_band[0]]
         masked_im.set_data(new_masked_data_slice)
         masked_im.set_clim(vmin=0, vmax=new_masked_max_val)
         ax[2].set_title(f'Masked Data, Band: {displayed_band[0] + 1}')
@@ -132,14 +155,21 @@ def visualize_interactive_thresholding():
     mask_band = [0]
     mask_threshold = [0]
 
-    cloud_mask = [cloud_detection.create_cloud_mask(radiance_data, mask_band[0], mask_threshold[0])]
-    masked_radiance_data = [cloud_detection.apply_cloud_mask(radiance_data, cloud_mask[0])]
+    # Only the mask is kept, the displayed band is masked on demand rather than
+    # masking the whole datacube. The mask buffer is reused for every new mask
+    _, num_rows, num_cols = radiance_data.shape
+    cloud_mask = [np.empty((num_rows, num_cols), dtype=np.uint8)]
+    cloud_detection.create_cloud_mask(radiance_data, mask_band[0], mask_threshold[0], out=cloud_mask[0])
+
+    # Precompute per-band maxima so slider updates are cheap
+    band_max = cloud_detection.compute_band_maxima(radiance_data)
+    masked_band_max = [cloud_detection.compute_band_maxima(radiance_data, cloud_mask[0])]
 
     fig, ax = plt.subplots(ncols=3)
 
     # Display band
-    data_slice = radiance_data[:, :, displayed_band[0]]
-    max_value = np.max(data_slice)
+    data_slice = radiance_data[displayed_band[0]]
+    max_value = band_max[displayed_band[0]]
     original_im = ax[0].imshow(data_slice, cmap='gray', vmin=0, vmax=max_value)
     ax[0].set_title(f'Original Data, Band: {displayed_band[0] + 1}')
 
@@ -148,8 +178,8 @@ def visualize_interactive_thresholding():
     ax[1].set_title(f'Cloud Mask (Band: {mask_band[0] + 1}, Threshold: {mask_threshold[0]:.2f})')
 
     # Display masked band
-    masked_data_slice = masked_radiance_data[0][:, :, displayed_band[0]]
-    masked_max_value = np.max(masked_data_slice)
+    masked_data_slice = np.where(cloud_mask[0], 0, radiance_data[displayed_band[0]])
+    masked_max_value = masked_band_max[0][displayed_band[0]]
     masked_im = ax[2].imshow(masked_data_slice, cmap='gray', vmin=0, vmax=masked_max_value)
     ax[2].set_title(f'Masked Data, Band: {displayed_band[0] + 1}')
 
@@ -169,15 +199,15 @@ def visualize_interactive_thresholding():
         mask_band[0] = int(band_textbox.text) - 1
         mask_threshold[0] = float(threshold_textbox.text)
 
-        cloud_mask[0] = cloud_detection.create_cloud_mask(radiance_data, mask_band[0], mask_threshold[0])
-        masked_radiance_data[0] = cloud_detection.apply_cloud_mask(radiance_data, cloud_mask[0])
+        cloud_detection.create_cloud_mask(radiance_data, mask_band[0], mask_threshold[0], out=cloud_mask[0])
+        masked_band_max[0] = cloud_detection.compute_band_maxima(radiance_data, cloud_mask[0])
 
         cloud_mask_im.set_data(cloud_mask[0])
         cloud_mask_im.set_clim(vmin=0, vmax=1)
         ax[1].set_title(f'Cloud Mask (Band: {mask_band[0] + 1}, Threshold: {mask_threshold[0]:.2f})')
 
-        masked_data_slice = masked_radiance_data[0][:, :, displayed_band[0]]
-        masked_max_val = np.max(masked_data_slice)
+        masked_data_slice = np.where(cloud_mask[0], 0, radiance_data[displayed_band[0]])
+        masked_max_val = masked_band_max[0][displayed_band[0]]
         masked_im.set_data(masked_data_slice)
         masked_im.set_clim(vmin=0, vmax=masked_max_val)
         ax[2].set_title(f'Masked Data, Band: {displayed_band[0] + 1}')
@@ -189,15 +219,15 @@ def visualize_interactive_thresholding():
         displayed_band[0] = int(band_slider.val) - 1
 
         # Update original band
-        new_data_slice = radiance_data[:, :, displayed_band[0]]
-        new_max_val = np.max(new_data_slice)
+        new_data_slice = radiance_data[displayed_band[0]]
+        new_max_val = band_max[displayed_band[0]]
         original_im.set_data(new_data_slice)
         original_im.set_clim(vmin=0, vmax=new_max_val)
         ax[0].set_title(f'Original Data, Band: {displayed_band[0] + 1}')
 
         # Update masked band
-        new_masked_data_slice = masked_radiance_data[0][:, :, displayed_band[0]]
-        new_masked_max_val = np.max(new_masked_data_slice)
+        new_masked_data_slice = np.where(cloud_mask[0], 0, radiance_data[displayed_band[0]])
+        new_masked_max_val = masked_band_max[0][displayed_band[0]]
         masked_im.set_data(new_masked_data_slice)
         masked_im.set_clim(vmin=0, vmax=new_masked_max_val)
         ax[2].set_title(f'Masked Data, Band: {displayed_band[0] + 1}')